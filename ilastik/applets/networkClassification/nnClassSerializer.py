@@ -24,8 +24,6 @@ import json
 import numpy as np
 import typing
 
-from tiktorch.types import Model, ModelState
-
 from ilastik.applets.base.appletSerializer import (
     AppletSerializer,
     SerialSlot,
@@ -58,8 +56,8 @@ class NNClassificationSerializer(AppletSerializer):
 
         slots = [
             SerialListSlot(topLevelOperator.LabelNames),
-            SerialListSlot(topLevelOperator.LabelColors, transform=lambda x: tuple(x.flat)),
-            SerialListSlot(topLevelOperator.PmapColors, transform=lambda x: tuple(x.flat)),
+            SerialListSlot(topLevelOperator.LabelColors, transform=lambda x: tuple(x.ravel().tolist())),
+            SerialListSlot(topLevelOperator.PmapColors, transform=lambda x: tuple(x.ravel().tolist())),
             SerialBlockSlot(
                 topLevelOperator.LabelImages,
                 topLevelOperator.LabelInputs,
@@ -18,7 +18,6 @@
 # on the ilastik web site at:
 #          http://ilastik.org/license.html
 ###############################################################################
-from functools import partial
 import numpy
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
@@ -34,9 +33,6 @@ from ilastik.utility import OpMultiLaneWrapper
 
 from ilastik.applets.pixelClassification.opPixelClassification import OpLabelPipeline, DatasetConstraintError
 
-from tiktorch.types import Model, ModelState
-from tiktorch.configkeys import TRAINING, NUM_ITERATIONS_MAX
-
 import logging
 
 logger = logging.getLogger(__name__)
@@ -177,7 +173,7 @@ class OpNNClassification(Operator):
             self.NumClasses.meta.NOTREADY = True
             return
 
-        numClasses = len(self.opModel.TiktorchModel.value.known_classes)
+        numClasses = len(model.known_classes)
         self.NumClasses.setValue(numClasses)
         self.opTrain.MaxLabel.setValue(numClasses)
 
@@ -211,6 +207,8 @@ class OpNNClassification(Operator):
 
         self.Checkpoints.setValue([])
         self._binary_model = None
+        # (channels, dimensions) shared by all lanes that passed _checkConstraints
+        self._validChannelsAndDims = None
 
         # SPECIAL connection: the LabelInputs slot doesn't get it's data
         # from the InputImages slot, but it's shape must match.
@@ -267,43 +265,56 @@ class OpNNClassification(Operator):
         self.CachedPredictionProbabilities.connect(self.opPredictionPipeline.CachedPredictionProbabilities)
         self.PredictionProbabilityChannels.connect(self.opPredictionPipeline.PredictionProbabilityChannels)
 
-        def inputResizeHandler(slot, oldsize, newsize):
-            if newsize == 0:
-                self.LabelImages.resize(0)
-                self.NonzeroLabelBlocks.resize(0)
-                self.PredictionProbabilities.resize(0)
-                self.CachedPredictionProbabilities.resize(0)
-
-        self.InputImages.notifyResized(inputResizeHandler)
+        self.InputImages.notifyResized(self._inputResizeHandler)
 
         # Debug assertions: Check to make sure the non-wrapped operators stayed that way.
         assert self.opTrain.Images.operator == self.opTrain
 
-        def handleNewInputImage(multislot, index, *args):
-            def handleInputReady(slot):
-                self._checkConstraints(index)
-                self.setupCaches(multislot.index(slot))
-
-            multislot[index].notifyReady(handleInputReady)
-
-        self.InputImages.notifyInserted(handleNewInputImage)
+        self.InputImages.notifyInserted(self._handleNewInputImage)
 
         # All input multi-slots should be kept in sync
         # Output multi-slots will auto-sync via the graph
-        multiInputs = [s for s in list(self.inputs.values()) if s.level >= 1]
-        for s1 in multiInputs:
-            for s2 in multiInputs:
-                if s1 != s2:
-
-                    def insertSlot(a, b, position, finalsize):
-                        a.insertSlot(position, finalsize)
-
-                    s1.notifyInserted(partial(insertSlot, s2))
-
-                    def removeSlot(a, b, position, finalsize):
-                        a.removeSlot(position, finalsize)
-
-                    s1.notifyRemoved(partial(removeSlot, s2))
+        # A single callback per slot forwards the change to all the others,
+        # so a lane insert/remove costs O(N) instead of O(N^2).
+        self._multiInputs = [s for s in list(self.inputs.values()) if s.level >= 1]
+        for s in self._multiInputs:
+            s.notifyInserted(self._insertSlot)
+            s.notifyRemoved(self._removeSlot)
+
+    def _handleNewInputImage(self, multislot, index, *args):
+        multislot[index].notifyReady(self._handleInputReady)
+
+    def _handleInputReady(self, slot):
+        laneIndex = self.InputImages.index(slot)
+        self._checkConstraints(laneIndex)
+        self.setupCaches(laneIndex)
+
+    def _insertSlot(self, slot, position, finalsize):
+        for other in self._multiInputs:
+            if other is not slot:
+                other.insertSlot(position, finalsize)
+
+    def _removeSlot(self, slot, position, finalsize):
+        for other in self._multiInputs:
+            if other is not slot:
+                other.removeSlot(position, finalsize)
+
+    def _inputResizeHandler(self, slot, oldsize, newsize):
+        if newsize == 0:
+            self._validChannelsAndDims = None
+            self._clearLaneOutputs()
+
+    def _clearLaneOutputs(self):
+        """
+        Drop all lanes of the per-lane outputs in one pass.
+        """
+        for outputSlot in (
+            self.LabelImages,
+            self.NonzeroLabelBlocks,
+            self.PredictionProbabilities,
+            self.CachedPredictionProbabilities,
+        ):
+            outputSlot.resize(0)
 
     def set_model(self, model_content: bytes) -> bool:
         self.ModelBinary.disconnect()
@@ -346,38 +357,47 @@ class OpNNClassification(Operator):
         if not self.InputImages[laneIndex].ready():
             return
 
-        thisLaneTaggedShape = self.InputImages[laneIndex].meta.getTaggedShape()
+        thisChannels, thisDims = self._channelsAndDims(self.InputImages[laneIndex].meta)
+        if (thisChannels, thisDims) == self._validChannelsAndDims:
+            return
 
         # Find a different lane and use it for comparison
-        validShape = thisLaneTaggedShape
+        validChannels, validDims = thisChannels, thisDims
         for i, slot in enumerate(self.InputImages):
             if slot.ready() and i != laneIndex:
-                validShape = slot.meta.getTaggedShape()
+                validChannels, validDims = self._channelsAndDims(slot.meta)
                 break
 
-        if "t" in thisLaneTaggedShape:
-            del thisLaneTaggedShape["t"]
-        if "t" in validShape:
-            del validShape["t"]
-
-        if validShape["c"] != thisLaneTaggedShape["c"]:
+        if validChannels != thisChannels:
             raise DatasetConstraintError(
                 "Pixel Classification with CNNs",
                 "All input images must have the same number of channels.  "
                 "Your new image has {} channel(s), but your other images have {} channel(s).".format(
-                    thisLaneTaggedShape["c"], validShape["c"]
+                    thisChannels, validChannels
                 ),
             )
 
-        if len(validShape) != len(thisLaneTaggedShape):
+        if validDims != thisDims:
             raise DatasetConstraintError(
                 "Pixel Classification with CNNs",
                 "All input images must have the same dimensionality.  "
                 "Your new image has {} dimensions (including channel), but your other images have {} dimensions.".format(
-                    len(thisLaneTaggedShape), len(validShape)
+                    thisDims, validDims
                 ),
             )
 
+        self._validChannelsAndDims = (thisChannels, thisDims)
+
+    @staticmethod
+    def _channelsAndDims(meta):
+        """
+        Return the channel count and the number of non-time axes of an image,
+        without building a tagged shape dict.
+        """
+        keys = meta.getAxisKeys()
+        numDims = len(keys) - 1 if "t" in keys else len(keys)
+        return meta.shape[keys.index("c")], numDims
+
     def setInSlot(self, slot, subindex, roi, value):
         # Nothing to do here: All inputs that support __setitem__
         #   are directly connected to internal operators.
@@ -394,6 +414,7 @@ class OpNNClassification(Operator):
         self.InputImages.resize(numLanes + 1)
 
     def removeLane(self, laneIndex, finalLength):
+        self._validChannelsAndDims = None
         self.InputImages.removeSlot(laneIndex, finalLength)
 
     def getLane(self, laneIndex):
@@ -414,21 +435,23 @@ class OpNNClassification(Operator):
             # FIXME: take the colors from default16_new
             from volumina import colortables
 
-            default_colors = colortables.default16_new
+            new_colors = colortables.default16_new[old_max:new_max]
 
-            label_colors = self.LabelColors.value
-            pmap_colors = self.PmapColors.value
+            label_colors = list(self.LabelColors.value)
+            label_colors.extend(new_colors)
+            pmap_colors = list(self.PmapColors.value)
+            pmap_colors.extend(new_colors)
 
-            self.LabelColors.setValue(label_colors + default_colors[old_max:new_max])
-            self.PmapColors.setValue(pmap_colors + default_colors[old_max:new_max])
+            self.LabelColors.setValue(label_colors)
+            self.PmapColors.setValue(pmap_colors)
 
     def mergeLabels(self, from_label, into_label):
-        for laneIndex in range(len(self.InputImages)):
-            self.getLane(laneIndex).opLabelPipeline.opLabelArray.mergeLabels(from_label, into_label)
+        for opLaneLabelPipeline in self.opLabelPipeline.innerOperators:
+            opLaneLabelPipeline.opLabelArray.mergeLabels(from_label, into_label)
 
     def clearLabel(self, label_value):
-        for laneIndex in range(len(self.InputImages)):
-            self.getLane(laneIndex).opLabelPipeline.opLabelArray.clearLabel(label_value)
+        for opLaneLabelPipeline in self.opLabelPipeline.innerOperators:
+            opLaneLabelPipeline.opLabelArray.clearLabel(label_value)
 
 
 class OpBlockShape(Operator):
@@ -440,43 +463,53 @@ class OpBlockShape(Operator):
 
     def __init__(self, *args, **kwargs):
         super(OpBlockShape, self).__init__(*args, **kwargs)
+        # Querying the model session goes through the tiktorch server, so the
+        # resulting block shapes are memoized per session and axis order.
+        self._cachedSession = None
+        self._cachedBlockShapes = {}
 
     def setupOutputs(self):
-        if self.ModelSession.value is _NO_MODEL:
+        session = self.ModelSession.value
+        if session is _NO_MODEL:
             self.BlockShapeTrain.meta.NOTREADY = True
             self.BlockShapeInference.meta.NOTREADY = True
             return
-        self.BlockShapeTrain.setValue(self.setup_train())
-        self.BlockShapeInference.setValue(self.setup_inference())
-
-    def setup_train(self):
-        tikmodel = self.ModelSession.value
-        training_shape = tikmodel.training_shape
-        halo = tikmodel.get_halo(axes="tczyx")
-        # total halo = 2 * halo per axis
-        total_halo = 2 * numpy.array(halo)
-        training_shape_wo_halo = numpy.array(training_shape) - total_halo
-        blockDims = dict(zip("tczyx", training_shape_wo_halo))
+
+        if session is not self._cachedSession:
+            self._cachedSession = session
+            self._cachedBlockShapes = {}
+
+        axisOrder = tuple(self.RawImage.meta.getAxisKeys())
+        if axisOrder not in self._cachedBlockShapes:
+            # total halo = 2 * halo per axis
+            total_halo = 2 * numpy.array(session.get_halo(axes="tczyx"))
+            self._cachedBlockShapes[axisOrder] = (
+                self.setup_train(axisOrder, total_halo),
+                self.setup_inference(axisOrder, total_halo),
+            )
+
+        blockShapeTrain, blockShapeInference = self._cachedBlockShapes[axisOrder]
+        self.BlockShapeTrain.setValue(blockShapeTrain)
+        self.BlockShapeInference.setValue(blockShapeInference)
+
+    @staticmethod
+    def _reorder(tczyx_shape, axisOrder):
+        blockDims = dict(zip("tczyx", tczyx_shape))
         blockDims["c"] = 9999  # always request all channels
-        axisOrder = self.RawImage.meta.getAxisKeys()
-        ret = tuple(blockDims[a] for a in axisOrder)
+        return tuple(blockDims[a] for a in axisOrder)
+
+    def setup_train(self, axisOrder, total_halo):
+        training_shape = self.ModelSession.value.training_shape
+        ret = self._reorder(numpy.array(training_shape) - total_halo, axisOrder)
         logger.debug(
             "got training shape %s and axisorder %s => Set BlockShapeTrain to %s", training_shape, axisOrder, ret
         )
         return ret
 
-    def setup_inference(self):
-        tikmodel = self.ModelSession.value
-        valid_tczyx_shapes = tikmodel.get_valid_shapes(axes="tczyx")
-        halo = tikmodel.get_halo(axes="tczyx")  # total halo = 2 * halo per axis
-        total_halo = 2 * numpy.array(halo)
-        valid_tczyx_shapes_wo_halo = [numpy.array(shape) - total_halo for shape in valid_tczyx_shapes]
-        largest_valid_shape = valid_tczyx_shapes_wo_halo[-1]
-
-        blockDims = dict(zip("tczyx", largest_valid_shape))
-        blockDims["c"] = 9999  # always request all channels
-        axisOrder = self.RawImage.meta.getAxisKeys()
-        ret = tuple(blockDims[a] for a in axisOrder)
+    def setup_inference(self, axisOrder, total_halo):
+        valid_tczyx_shapes = self.ModelSession.value.get_valid_shapes(axes="tczyx")
+        largest_valid_shape = numpy.array(valid_tczyx_shapes[-1]) - total_halo
+        ret = self._reorder(largest_valid_shape, axisOrder)
         logger.debug(
             "got largest valid shape %s and axis order %s => Set BlockShapeInference to %s",
             largest_valid_shape,
@@ -1,7 +1,5 @@
 from pathlib import Path
-import os
 import shutil
-import tempfile
 import threading
 import time
 import queue
@@ -290,28 +288,27 @@ def tmp_n5_file(tmp_path: Path) -> Path:
     return n5_dir_path
 
 
-@pytest.fixture
-def png_image(tmp_path) -> Path:
-    _, filepath = tempfile.mkstemp(prefix=os.path.join(tmp_path, ""), suffix=".png")
+def _create_png_image(tmp_path_factory, name: str) -> Path:
+    filepath = tmp_path_factory.mktemp("png_image") / f"{name}.png"
     pil_image = PilImage.fromarray((numpy.random.rand(100, 200) * 255).astype(numpy.uint8))
-    with open(filepath, "wb") as png_file:
-        pil_image.save(png_file, "png")
-    return Path(filepath)
+    pil_image.save(filepath, "png")
+    return filepath
 
 
-@pytest.fixture
-def another_png_image(tmp_path) -> Path:
-    _, filepath = tempfile.mkstemp(prefix=os.path.join(tmp_path, ""), suffix=".png")
-    pil_image = PilImage.fromarray((numpy.random.rand(100, 200) * 255).astype(numpy.uint8))
-    with open(filepath, "wb") as png_file:
-        pil_image.save(png_file, "png")
-    return Path(filepath)
+# Test images are only ever read, so they are created once per session
+@pytest.fixture(scope="session")
+def png_image(tmp_path_factory) -> Path:
+    return _create_png_image(tmp_path_factory, "png_image")
+
+
+@pytest.fixture(scope="session")
+def another_png_image(tmp_path_factory) -> Path:
+    return _create_png_image(tmp_path_factory, "another_png_image")
 
 
 @pytest.fixture
 def empty_project_file(tmp_path) -> h5py.File:
-    project_path = tmp_path / tempfile.mkstemp(suffix=".ilp")[1]
-    with h5py.File(project_path, "r+") as f:
+    with h5py.File(tmp_path / "empty_project.ilp", "w") as f:
         yield f
 
 
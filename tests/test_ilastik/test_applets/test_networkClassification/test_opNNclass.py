@@ -0,0 +1,147 @@
+import pytest
+
+pytest.importorskip("lazyflow.operators.tiktorch")
+
+from lazyflow.graph import Graph, Operator
+from ilastik.applets.base.applet import DatasetConstraintError
+from ilastik.applets.networkClassification.opNNclass import OpBlockShape, OpNNClassification
+
+import numpy as np
+import vigra
+
+
+@pytest.fixture
+def graph():
+    return Graph()
+
+
+class FakeSession:
+    training_shape = (1, 1, 1, 128, 96)
+
+    def __init__(self):
+        self.halo_calls = 0
+        self.valid_shapes_calls = 0
+
+    def get_halo(self, axes):
+        assert axes == "tczyx"
+        self.halo_calls += 1
+        return (0, 0, 0, 8, 4)
+
+    def get_valid_shapes(self, axes):
+        assert axes == "tczyx"
+        self.valid_shapes_calls += 1
+        return [(1, 1, 1, 64, 64), (1, 1, 1, 256, 192)]
+
+
+class TestOpBlockShape:
+    @pytest.fixture
+    def op(self, graph):
+        op = OpBlockShape(graph=graph)
+        op.RawImage.setValue(vigra.taggedView(np.zeros((10, 300, 200, 3), dtype=np.uint8), "zyxc"))
+        return op
+
+    def test_block_shapes(self, op):
+        op.ModelSession.setValue(FakeSession())
+
+        # shape minus twice the halo, reordered to zyxc and requesting all channels
+        assert op.BlockShapeTrain.value == (1, 112, 88, 9999)
+        assert op.BlockShapeInference.value == (1, 240, 184, 9999)
+
+    def test_repeated_setup_does_not_query_session(self, op):
+        session = FakeSession()
+        op.ModelSession.setValue(session)
+        assert (session.halo_calls, session.valid_shapes_calls) == (1, 1)
+
+        op.setupOutputs()
+        op.RawImage.setValue(vigra.taggedView(np.zeros((20, 300, 200, 3), dtype=np.uint8), "zyxc"))
+
+        assert (session.halo_calls, session.valid_shapes_calls) == (1, 1)
+        assert op.BlockShapeTrain.value == (1, 112, 88, 9999)
+        assert op.BlockShapeInference.value == (1, 240, 184, 9999)
+
+    def test_dirty_session_keeps_cache(self, op):
+        session = FakeSession()
+        op.ModelSession.setValue(session)
+
+        op.ModelSession.setDirty()
+        op.setupOutputs()
+
+        assert (session.halo_calls, session.valid_shapes_calls) == (1, 1)
+
+    def test_new_session_recomputes(self, op):
+        first = FakeSession()
+        op.ModelSession.setValue(first)
+
+        second = FakeSession()
+        op.ModelSession.setValue(second)
+
+        assert (first.halo_calls, first.valid_shapes_calls) == (1, 1)
+        assert (second.halo_calls, second.valid_shapes_calls) == (1, 1)
+        assert op.BlockShapeTrain.value == (1, 112, 88, 9999)
+
+    def test_new_axis_order_recomputes(self, op):
+        session = FakeSession()
+        op.ModelSession.setValue(session)
+
+        op.RawImage.setValue(vigra.taggedView(np.zeros((300, 200, 3), dtype=np.uint8), "yxc"))
+
+        assert (session.halo_calls, session.valid_shapes_calls) == (2, 2)
+        assert op.BlockShapeTrain.value == (112, 88, 9999)
+        assert op.BlockShapeInference.value == (240, 184, 9999)
+
+
+class TestInputConstraints:
+    @pytest.fixture
+    def op(self, graph):
+        # OpNNClassification creates some of its internal operators as siblings
+        parent = Operator(graph=graph)
+        return OpNNClassification(parent=parent)
+
+    @staticmethod
+    def image(axes, shape):
+        return vigra.taggedView(np.zeros(shape, dtype=np.uint8), axes)
+
+    def add_image(self, op, image):
+        laneIndex = len(op.InputImages)
+        op.addLane(laneIndex)
+        op.InputImages[laneIndex].setValue(image)
+
+    def test_matching_lane_returns_early(self, op, monkeypatch):
+        self.add_image(op, self.image("yxc", (20, 30, 3)))
+        self.add_image(op, self.image("yxc", (40, 10, 3)))
+        assert op._validChannelsAndDims == (3, 3)
+
+        calls = []
+
+        def channelsAndDims(meta):
+            calls.append(meta)
+            return OpNNClassification._channelsAndDims(meta)
+
+        monkeypatch.setattr(op, "_channelsAndDims", channelsAndDims)
+        op._checkConstraints(1)
+
+        # only the checked lane is inspected, no comparison lane is looked up
+        assert len(calls) == 1
+
+    @pytest.mark.parametrize("other", [("yxc", (20, 30, 1)), ("zyxc", (5, 20, 30, 3))])
+    def test_mismatching_lane_raises(self, op, other):
+        self.add_image(op, self.image("yxc", (20, 30, 3)))
+
+        with pytest.raises(DatasetConstraintError):
+            self.add_image(op, self.image(*other))
+
+    def test_remove_lane_resets_constraints(self, op):
+        self.add_image(op, self.image("yxc", (20, 30, 3)))
+        op.removeLane(0, 0)
+        assert op._validChannelsAndDims is None
+
+        self.add_image(op, self.image("zyxc", (5, 20, 30, 1)))
+        assert op._validChannelsAndDims == (1, 4)
+
+    def test_resize_to_zero_resets_constraints(self, op):
+        self.add_image(op, self.image("yxc", (20, 30, 3)))
+        op.InputImages.resize(0)
+        assert op._validChannelsAndDims is None
+
+        self.add_image(op, self.image("zyxc", (5, 20, 30, 1)))
+        assert op._validChannelsAndDims == (1, 4)
@@ -2,14 +2,12 @@ import os
 from typing import List, Tuple
 from numbers import Number
 from pathlib import Path
+import shutil
 import pytest
-import requests
-import tempfile
-import uuid
 import h5py
 
 import numpy
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSignalBlocker
 
 from ilastik.applets.dataSelection.datasetInfoEditorWidget import DatasetInfoEditorWidget
 from ilastik.applets.dataSelection.dataSelectionSerializer import DataSelectionSerializer
@@ -24,78 +22,98 @@ def image_yxc_fs_info(png_image, empty_project_file):
     return FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def image_zyxc_stack_path(png_image, another_png_image):
-    return str(png_image) + os.path.pathsep + str(another_png_image)
-
+    return os.pathsep.join((str(png_image), str(another_png_image)))
 
-@pytest.fixture
-def empty_project_file() -> h5py.File:
-    return h5py.File(tempfile.mkstemp()[1], "r+")
 
-
-DONT_SET_NORMALIZE = object()
 TOP_GROUP_NAME = "my_group"
 
 
-def create_and_modify_widget(
-    qtbot,
-    infos: List[DatasetInfo],
-    project_file: h5py.File,
-    nickname: str = None,
-    axiskeys: str = "",
-    normalizeDisplay: bool = DONT_SET_NORMALIZE,
-    drange: Tuple[Number, Number] = None,
-    display_mode: str = None,
-    location: type = None,
-):
-    project_file = project_file or empty_project_file()
-
+def create_widget(infos: List[DatasetInfo], project_file: h5py.File) -> DatasetInfoEditorWidget:
     opDataSelectionGroup = OpDataSelectionGroup(graph=Graph())
     opDataSelectionGroup.ProjectFile.setValue(project_file)
     opDataSelectionGroup.ProjectDataGroup.setValue(TOP_GROUP_NAME)
 
     serializer = DataSelectionSerializer(opDataSelectionGroup, TOP_GROUP_NAME)
     widget = DatasetInfoEditorWidget(None, infos, serializer)
-    qtbot.addWidget(widget)
+    # Tests check widget state, not pixels: show() still makes children visible, but nothing is painted
+    widget.setAttribute(Qt.WA_DontShowOnScreen, True)
     widget.show()
+    return widget
 
-    assert widget.multi_axes_display.text() == "Current: " + ", ".join(info.axiskeys for info in infos)
 
-    if axiskeys:
-        assert widget.axesEdit.isVisible()
-        assert widget.axesEdit.isEnabled()
-        widget.axesEdit.setText(axiskeys)
+@pytest.fixture(scope="module")
+def image_yxc_editor_widget(qapp, png_image, tmp_path_factory):
+    """
+    A single editor widget shared by tests that only look at validation feedback
+    """
+    with h5py.File(tmp_path_factory.mktemp("project") / "project.ilp", "w") as project_file:
+        info = FilesystemDatasetInfo(filePath=str(png_image), project_file=project_file)
+        widget = create_widget([info], project_file)
+        yield widget
+        widget.close()
+
+
+def _set_axiskeys(widget: DatasetInfoEditorWidget, axiskeys: str):
+    assert widget.axesEdit.isVisible()
+    assert widget.axesEdit.isEnabled()
+    widget.axesEdit.setText(axiskeys)
+
+
+def _set_nickname(widget: DatasetInfoEditorWidget, nickname: str):
+    assert widget.nicknameEdit.isEnabled()
+    widget.nicknameEdit.setText(nickname)
+
+
+def _set_drange(widget: DatasetInfoEditorWidget, drange: Tuple[Number, Number]):
+    widget.rangeMinSpinBox.setValue(drange[0])
+    widget.rangeMaxSpinBox.setValue(drange[1])
 
-    if nickname:
-        assert widget.nicknameEdit.isEnabled()
-        widget.nicknameEdit.setText("SOME_NICKNAME")
 
-    if normalizeDisplay is not DONT_SET_NORMALIZE:
-        widget.normalizeDisplayComboBox.setCurrentIndex(widget.normalizeDisplayComboBox.findData(normalizeDisplay))
+def _select_data(combo_box, data):
+    combo_box.setCurrentIndex(combo_box.findData(data))
 
-    if drange is not None:
-        widget.rangeMinSpinBox.setValue(drange[0])
-        widget.rangeMaxSpinBox.setValue(drange[1])
 
-    if display_mode is not None:
-        index = widget.displayModeComboBox.findData(display_mode)
-        widget.displayModeComboBox.setCurrentIndex(index)
+# Maps each keyword accepted by create_and_modify_widget to the function applying it to the widget
+WIDGET_MODIFIERS = {
+    "axiskeys": _set_axiskeys,
+    "nickname": _set_nickname,
+    "normalizeDisplay": lambda widget, normalize: _select_data(widget.normalizeDisplayComboBox, normalize),
+    "drange": _set_drange,
+    "display_mode": lambda widget, display_mode: _select_data(widget.displayModeComboBox, display_mode),
+    "location": lambda widget, location: _select_data(widget.storageComboBox, location),
+}
 
-    if location is not None:
-        comboIndex = widget.storageComboBox.findData(location)
-        widget.storageComboBox.setCurrentIndex(comboIndex)
+
+def create_and_modify_widget(qtbot, infos: List[DatasetInfo], project_file: h5py.File, **modifications):
+    """
+    :param modifications: field values to enter into the widget, see WIDGET_MODIFIERS for the accepted keys
+    """
+    widget = create_widget(infos, project_file)
+    qtbot.addWidget(widget)
+
+    # Every edit of these fields would trigger its own validation pass, validate once at the end instead
+    with QSignalBlocker(widget.axesEdit), QSignalBlocker(widget.rangeMinSpinBox), QSignalBlocker(
+        widget.rangeMaxSpinBox
+    ):
+        for field, value in modifications.items():
+            WIDGET_MODIFIERS[field](widget, value)
+
+    widget.validate_new_data()
 
     return widget
 
 
-def accept_widget(qtbot, widget: DatasetInfoEditorWidget) -> List[DatasetInfo]:
-    qtbot.mouseClick(widget.okButton, Qt.LeftButton)
+def accept_widget(widget: DatasetInfoEditorWidget) -> List[DatasetInfo]:
+    widget.okButton.click()
     return widget.edited_infos
 
 
-def test_datasetinfo_editor_widget_shows_correct_data_on_single_info(qtbot, png_image, empty_project_file):
-    info = FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
+def test_datasetinfo_editor_widget_shows_correct_data_on_single_info(
+    qtbot, png_image, image_yxc_fs_info, empty_project_file
+):
+    info = image_yxc_fs_info
     assert info.axiskeys == "yxc"
     assert info.laneDtype == numpy.uint8
     assert info.laneShape == (100, 200, 1)
@@ -104,17 +122,25 @@ def test_datasetinfo_editor_widget_shows_correct_data_on_single_info(qtbot, png_
 
     assert editor_widget.axesEdit.maxLength() == 3
     assert "".join(tag.key for tag in editor_widget.get_new_axes_tags()) == "yxc"
-    assert editor_widget.nicknameEdit.text() == Path(png_image).stem
+    assert editor_widget.nicknameEdit.text() == png_image.stem
     assert editor_widget.nicknameEdit.isEnabled()
     assert editor_widget.normalizeDisplayComboBox.isVisible()
     assert editor_widget.storageComboBox.isVisible()
 
-    edited_info = accept_widget(qtbot, editor_widget)[0]
-    assert editor_widget.edited_infos[0].axistags == info.axistags
+    edited_info = accept_widget(editor_widget)[0]
+    assert edited_info.axistags == info.axistags
+
+
+def test_multi_axes_display_shows_current_axes(qtbot, image_yxc_fs_info, image_zyxc_stack_path, empty_project_file):
+    stack_info = FilesystemDatasetInfo(
+        filePath=image_zyxc_stack_path, sequence_axis="z", project_file=empty_project_file
+    )
+    widget = create_and_modify_widget(qtbot, [image_yxc_fs_info, stack_info], project_file=empty_project_file)
+    assert widget.multi_axes_display.text() == "Current: yxc, zyxc"
 
 
-def test_datasetinfo_editor_widget_modifies_single_info(qtbot, png_image, empty_project_file):
-    info = FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
+def test_datasetinfo_editor_widget_modifies_single_info(qtbot, png_image, image_yxc_fs_info, empty_project_file):
+    info = image_yxc_fs_info
     widget = create_and_modify_widget(
         qtbot,
         [info],
@@ -126,20 +152,20 @@ def test_datasetinfo_editor_widget_modifies_single_info(qtbot, png_image, empty_
         display_mode="alpha-modulated",
         location=RelativeFilesystemDatasetInfo,
     )
-    edited_info = accept_widget(qtbot, widget)[0]
+    edited_info = accept_widget(widget)[0]
     assert edited_info.axiskeys == "xyc"
     assert edited_info.nickname == "SOME_NICKNAME"
     assert edited_info.normalizeDisplay == True
     assert edited_info.drange == (10, 20)
     assert edited_info.display_mode == "alpha-modulated"
     assert isinstance(edited_info, RelativeFilesystemDatasetInfo)
-    assert edited_info.filePath == Path(png_image).absolute().as_posix()
+    assert edited_info.filePath == png_image.absolute().as_posix()
 
 
 def test_datasetinfo_editor_widget_shows_correct_data_on_multiple_info(
-    qtbot, png_image, another_png_image, empty_project_file
+    qtbot, png_image, another_png_image, image_yxc_fs_info, empty_project_file
 ):
-    info = FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
+    info = image_yxc_fs_info
     info_2 = FilesystemDatasetInfo(filePath=str(another_png_image), project_file=empty_project_file)
 
     widget = create_and_modify_widget(qtbot=qtbot, infos=[info, info_2], project_file=empty_project_file)
@@ -147,15 +173,14 @@ def test_datasetinfo_editor_widget_shows_correct_data_on_multiple_info(
     assert widget.axesEdit.maxLength() == 3
     assert "".join(tag.key for tag in widget.get_new_axes_tags()) == "yxc"
     assert not widget.nicknameEdit.isEnabled()
-    assert widget.nicknameEdit.text() == Path(png_image).stem + ", " + Path(another_png_image).stem
+    assert widget.nicknameEdit.text() == png_image.stem + ", " + another_png_image.stem
 
 
 def test_datasetinfo_editor_widget_shows_edits_data_on_multiple_infos_with_same_dimensionality(
-    qtbot, png_image, another_png_image, empty_project_file
+    qtbot, another_png_image, image_yxc_fs_info, empty_project_file
 ):
-    info_1 = FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
+    info_1 = image_yxc_fs_info
     info_2 = FilesystemDatasetInfo(filePath=str(another_png_image), project_file=empty_project_file)
-    project_file_dir = str(Path(png_image).parent)
 
     widget = create_and_modify_widget(
         qtbot,
@@ -167,7 +192,7 @@ def test_datasetinfo_editor_widget_shows_edits_data_on_multiple_infos_with_same_
         drange=(20, 40),
     )
 
-    edited_infos = accept_widget(qtbot, widget)
+    edited_infos = accept_widget(widget)
     assert all(info.axiskeys == "cxy" for info in edited_infos)
     assert all(info.display_mode == "binary-mask" for info in edited_infos)
     assert all(info.normalizeDisplay == True for info in edited_infos)
@@ -175,9 +200,9 @@ def test_datasetinfo_editor_widget_shows_edits_data_on_multiple_infos_with_same_
 
 
 def test_cannot_edit_axis_tags_on_images_of_different_dimensionality(
-    qtbot, png_image, image_zyxc_stack_path, empty_project_file
+    qtbot, image_yxc_fs_info, image_zyxc_stack_path, empty_project_file
 ):
-    info_1 = FilesystemDatasetInfo(filePath=str(png_image), project_file=empty_project_file)
+    info_1 = image_yxc_fs_info
     info_2 = FilesystemDatasetInfo(
         filePath=str(image_zyxc_stack_path), sequence_axis="z", project_file=empty_project_file
     )
@@ -185,7 +210,7 @@ def test_cannot_edit_axis_tags_on_images_of_different_dimensionality(
     widget = create_and_modify_widget(qtbot, [info_1, info_2], project_file=empty_project_file)
     assert not widget.axesEdit.isEnabled()
 
-    edited_infos = accept_widget(qtbot, widget)
+    edited_infos = accept_widget(widget)
     assert edited_infos[0].axiskeys == info_1.axiskeys and edited_infos[1].axiskeys == info_2.axiskeys
 
 
@@ -198,10 +223,9 @@ def test_immediate_accept_does_not_change_values(qtbot, png_image, image_zyxc_st
         normalizeDisplay=True,
         drange=(56, 78),
     )
-    project_file_dir = str(Path(png_image).parent)
 
     widget = create_and_modify_widget(qtbot, [info_1, info_2], project_file=empty_project_file)
-    edited_infos = accept_widget(qtbot, widget)
+    edited_infos = accept_widget(widget)
 
     assert info_1.axiskeys == edited_infos[0].axiskeys == "yxc"
     assert info_2.axiskeys == edited_infos[1].axiskeys == "zyxc"
@@ -211,64 +235,65 @@ def test_immediate_accept_does_not_change_values(qtbot, png_image, image_zyxc_st
     assert info_2.drange == edited_infos[1].drange == (56, 78)
 
 
-def test_too_few_axeskeys_shows_error(qtbot, image_yxc_fs_info, empty_project_file):
-    widget = create_and_modify_widget(qtbot, [image_yxc_fs_info], empty_project_file, axiskeys="xy")
-    assert widget.axes_error_display.text() != ""
-
-
-def test_garbled_axeskeys_shows_error(qtbot, image_yxc_fs_info):
-    widget = create_and_modify_widget(qtbot, [image_yxc_fs_info], empty_project_file, axiskeys="ab")
-    assert widget.axes_error_display.text() != ""
-
-
-def test_repeated_axeskeys_shows_error(qtbot, image_yxc_fs_info):
-    widget = create_and_modify_widget(qtbot, [image_yxc_fs_info], empty_project_file, axiskeys="yy")
-    assert widget.axes_error_display.text() != ""
+@pytest.mark.parametrize("axiskeys", ["xy", "ab", "yy"])
+def test_bad_axeskeys_shows_error(image_yxc_editor_widget, axiskeys):
+    widget = image_yxc_editor_widget
+    assert widget.axesEdit.isEnabled()
+    try:
+        widget.axesEdit.setText(axiskeys)
+        assert widget.axes_error_display.text() != ""
+    finally:
+        widget.axesEdit.setText("yxc")
 
 
 def test_switch_to_project_internal_saves_data_to_project(qtbot, image_yxc_fs_info, empty_project_file):
     widget = create_and_modify_widget(
         qtbot, infos=[image_yxc_fs_info], project_file=empty_project_file, location=ProjectInternalDatasetInfo
     )
-    new_info = accept_widget(qtbot, widget)[0]
+    new_info = accept_widget(widget)[0]
     assert new_info.inner_path in empty_project_file
 
 
-def test_switch_from_absolute_to_relative(qtbot, image_yxc_fs_info, empty_project_file):
+def test_switch_from_absolute_to_relative(qtbot, png_image, empty_project_file):
+    # relative links are only possible for files below the project directory
+    image_dir = Path(empty_project_file.filename).parent / "images"
+    image_dir.mkdir()
+    image_path = shutil.copy(png_image, image_dir)
+    info = FilesystemDatasetInfo(filePath=str(image_path), project_file=empty_project_file)
+
     widget = create_and_modify_widget(
-        qtbot, infos=[image_yxc_fs_info], project_file=empty_project_file, location=RelativeFilesystemDatasetInfo
+        qtbot, infos=[info], project_file=empty_project_file, location=RelativeFilesystemDatasetInfo
     )
-    new_info = accept_widget(qtbot, widget)[0]
+    new_info = accept_widget(widget)[0]
     assert isinstance(new_info, RelativeFilesystemDatasetInfo)
-    relative_path = Path(image_yxc_fs_info.filePath).relative_to(Path(empty_project_file.filename).parent)
-    assert new_info.effective_path == str(relative_path)
+    assert new_info.effective_path == str(Path("images") / png_image.name)
 
 
 def test_modify_project_internal_datasetinfo(qtbot, image_yxc_fs_info, empty_project_file):
     widget = create_and_modify_widget(
         qtbot, infos=[image_yxc_fs_info], project_file=empty_project_file, location=ProjectInternalDatasetInfo
     )
-    new_info = accept_widget(qtbot, widget)[0]
+    new_info = accept_widget(widget)[0]
     assert isinstance(new_info, ProjectInternalDatasetInfo)
     assert new_info.inner_path in empty_project_file
 
     widget = create_and_modify_widget(
         qtbot, infos=[new_info], project_file=empty_project_file, display_mode="grayscale"
     )
-    new_info = accept_widget(qtbot, widget)[0]
+    new_info = accept_widget(widget)[0]
 
     assert isinstance(new_info, ProjectInternalDatasetInfo)
     assert new_info.display_mode == "grayscale"
 
 
-def test_modify_axistags_in_stack(qtbot, png_image, another_png_image, empty_project_file):
-    info = FilesystemDatasetInfo(filePath=str(png_image) + os.path.pathsep + str(another_png_image), sequence_axis="t")
+def test_modify_axistags_in_stack(qtbot, image_zyxc_stack_path, empty_project_file):
+    info = FilesystemDatasetInfo(filePath=image_zyxc_stack_path, sequence_axis="t")
     widget = create_and_modify_widget(qtbot, infos=[info], project_file=empty_project_file, axiskeys="zxyc")
-    new_info = accept_widget(qtbot, widget)[0]
+    new_info = accept_widget(widget)[0]
     assert new_info.axiskeys == "zxyc"
 
     widget2 = create_and_modify_widget(
         qtbot, infos=[new_info], project_file=empty_project_file, axiskeys="txyc", location=ProjectInternalDatasetInfo
     )
-    new_info2 = accept_widget(qtbot, widget2)[0]
+    new_info2 = accept_widget(widget2)[0]
     assert new_info2.axiskeys == "txyc"